@@ -0,0 +1,53 @@
+const mongoose = require('mongoose');
+
+// Mergeable partial aggregates for one time bucket of scored readings
+const bucketSchema = new mongoose.Schema({
+  start: {
+    type: Date,
+    required: true
+  },
+  count: { type: Number, default: 0 },
+  anomalyCount: { type: Number, default: 0 },
+  riskSum: { type: Number, default: 0 },
+  riskMin: Number,
+  riskMax: Number,
+  severityCounts: {
+    low: { type: Number, default: 0 },
+    medium: { type: Number, default: 0 },
+    high: { type: Number, default: 0 },
+    critical: { type: Number, default: 0 }
+  },
+  driverSums: {
+    type: Map,
+    of: Number,
+    default: {}
+  }
+}, { _id: false });
+
+const mlAnalysisCacheSchema = new mongoose.Schema({
+  userId: {
+    type: mongoose.Schema.Types.ObjectId,
+    ref: 'User',
+    required: true
+  },
+  bucketMs: {
+    type: Number,
+    required: true
+  },
+  modelVersion: {
+    type: String,
+    required: true
+  },
+  // Buckets in [coveredFrom, coveredThrough) are complete and stored, empty ones omitted
+  coveredFrom: Date,
+  coveredThrough: Date,
+  buckets: [bucketSchema],
+  updatedAt: {
+    type: Date,
+    default: Date.now
+  }
+});
+
+mlAnalysisCacheSchema.index({ userId: 1, bucketMs: 1 }, { unique: true });
+
+module.exports = mongoose.model('MLAnalysisCache', mlAnalysisCacheSchema);
@@ -124,13 +124,21 @@ router.post('/predict', authenticate, async (req, res) => {
 
 /**
  * @route   GET /api/ml/analyze/:patientId
- * @desc    Analyze historical data for a patient
+ * @desc    Analyze historical data for a patient (?incremental=true or ?format=compact, not both)
  * @access  Private
  */
 router.get('/analyze/:patientId', authenticate, async (req, res) => {
   try {
     const { patientId } = req.params;
-    const { period = '24h' } = req.query;
+    const { period = '24h', incremental, format } = req.query;
+    
+    // Incremental analysis merges cached bucket aggregates and has no per-reading arrays to encode
+    if (incremental === 'true' && format === 'compact') {
+      return res.status(400).json({
+        success: false,
+        error: 'incremental=true and format=compact cannot be combined'
+      });
+    }
     
     // Calculate date range
     let startDate = new Date();
@@ -151,13 +159,36 @@ router.get('/analyze/:patientId', authenticate, async (req, res) => {
         startDate.setHours(startDate.getHours() - 24);
     }
     
-    // Fetch sensor data
-    const sensorData = await SensorData.find({
-      userId: patientId,
-      recordedAt: { $gte: startDate }
-    }).sort({ recordedAt: -1 });
+    let analysis;
+    if (incremental === 'true') {
+      // Reuse cached per-bucket aggregates and only score readings not yet covered
+      analysis = await mlService.analyzeIncremental(patientId, startDate);
+    } else {
+      // Fetch sensor data
+      const sensorData = await SensorData.find({
+        userId: patientId,
+        recordedAt: { $gte: startDate }
+      }).sort({ recordedAt: -1 });
+      
+      // Prepare data for ML analysis
+      const historicalData = sensorData.map(data => mlService.toReading(data));
+      
+      if (historicalData.length === 0) {
+        analysis = { total_readings: 0 };
+      } else if (format === 'compact') {
+        // Per-reading predictions stay base64-encoded; typed arrays would serialize as objects
+        const compact = await mlService.predictBatchCompact(historicalData, { decode: false });
+        analysis = {
+          ...mlService.summarizeCompact(mlService.decodeCompactResult(compact)),
+          predictions: compact
+        };
+      } else {
+        // Get batch analysis from ML model
+        analysis = await mlService.analyzeBatch(historicalData);
+      }
+    }
     
-    if (sensorData.length === 0) {
+    if (analysis.total_readings === 0) {
       return res.json({
         success: true,
         analysis: {
@@ -168,20 +199,6 @@ router.get('/analyze/:patientId', authenticate, async (req, res) => {
       });
     }
     
-    // Prepare data for ML analysis
-    const historicalData = sensorData.map(data => ({
-      heart_rate: data.heartRate?.value || 0,
-      spo2: data.spO2?.value || 0,
-      temperature: data.temperature?.value || 0,
-      bp_systolic: data.bloodPressure?.systolic || 0,
-      bp_diastolic: data.bloodPressure?.diastolic || 0,
-      ecg: data.ecg?.value || 0,
-      timestamp: data.recordedAt
-    }));
-    
-    // Get batch analysis from ML model
-    const analysis = await mlService.analyzeBatch(historicalData);
-    
     // Get recent ML predictions for this patient
     const recentAlerts = await Alert.find({
       userId: patientId,
@@ -215,6 +232,42 @@ router.get('/analyze/:patientId', authenticate, async (req, res) => {
   }
 });
 
+/**
+ * @route   GET /api/ml/drift
+ * @desc    Input-drift report against the training distribution, globally and per patient
+ * @access  Private (Doctor/Admin)
+ */
+router.get('/drift', authenticate, requireDoctorOrSuperAdmin, async (req, res) => {
+  try {
+    const { hours = 24 } = req.query;
+    const startDate = new Date(Date.now() - Number(hours) * 60 * 60 * 1000);
+    
+    const sensorData = await SensorData.find({ recordedAt: { $gte: startDate } })
+      .sort({ recordedAt: 1 })
+      .lean();
+    
+    const readings = sensorData.map(data => ({
+      patient_id: String(data.userId),
+      ...mlService.toReading(data)
+    }));
+    
+    const report = await mlService.driftReport(readings);
+    
+    res.json({
+      success: true,
+      drift: report,
+      totalReadings: readings.length,
+      since: startDate
+    });
+  } catch (error) {
+    console.error('ML drift report error:', error);
+    res.status(500).json({ 
+      success: false,
+      error: error.message 
+    });
+  }
+});
+
 /**
  * @route   GET /api/ml/anomalies
  * @desc    Get all detected anomalies
@@ -1,5 +1,9 @@
 const { spawn } = require('child_process');
 const path = require('path');
+const SensorData = require('../models/SensorData');
+const MLAnalysisCache = require('../models/MLAnalysisCache');
+
+const SEVERITY_LEVELS = ['low', 'medium', 'high', 'critical'];
 
 class MLService {
   constructor() {
@@ -89,18 +93,21 @@ class MLService {
   }
 
   /**
-   * Analyze batch of historical data
-   * @param {Array} historicalData - Array of sensor readings
-   * @returns {Promise<Object>} Analysis results with patterns and trends
+   * Run an ml_predictor.py command with a JSON payload on stdin
+   * @param {String} command - ml_predictor.py command name
+   * @param {*} payload - JSON-serializable input; stdin avoids the 128 KiB argv limit
+   * @param {String} label - Operation name used in error messages
+   * @returns {Promise<Object>} Parsed JSON result
    */
-  async analyzeBatch(historicalData) {
+  runPythonCommand(command, payload, label) {
     return new Promise((resolve, reject) => {
       const pythonProcess = spawn('python', [
         this.pythonScriptPath,
-        'analyze_batch',
-        JSON.stringify(historicalData)
+        command
       ]);
 
+      pythonProcess.stdin.end(JSON.stringify(payload));
+
       let dataString = '';
       let errorString = '';
 
@@ -114,17 +121,349 @@ class MLService {
 
       pythonProcess.on('close', (code) => {
         if (code !== 0) {
-          reject(new Error(`Batch analysis failed: ${errorString}`));
+          reject(new Error(`${label} failed: ${errorString}`));
         } else {
           try {
-            const result = JSON.parse(dataString);
-            resolve(result);
+            // load_model logs to stdout, so the result is the last line
+            const lines = dataString.trim().split('\n');
+            resolve(JSON.parse(lines[lines.length - 1]));
           } catch (error) {
-            reject(new Error('Failed to parse batch analysis result'));
+            reject(new Error(`Failed to parse ${label.toLowerCase()} result`));
           }
         }
       });
+
+      pythonProcess.on('error', (error) => {
+        reject(new Error(`Failed to spawn Python process: ${error.message}`));
+      });
+    });
+  }
+
+  /**
+   * Map a SensorData document to the reading shape ml_predictor.py expects
+   * @param {Object} data - SensorData document
+   * @returns {Object} Vital signs with a timestamp
+   */
+  toReading(data) {
+    return {
+      heart_rate: data.heartRate?.value || 0,
+      spo2: data.spO2?.value || 0,
+      temperature: data.temperature?.value || 0,
+      bp_systolic: data.bloodPressure?.systolic || 0,
+      bp_diastolic: data.bloodPressure?.diastolic || 0,
+      ecg: data.ecg?.value || 0,
+      timestamp: data.recordedAt
+    };
+  }
+
+  /**
+   * Analyze batch of historical data
+   * @param {Array} historicalData - Array of sensor readings
+   * @returns {Promise<Object>} Analysis results with patterns and trends
+   */
+  async analyzeBatch(historicalData) {
+    return this.runPythonCommand('analyze_batch', historicalData, 'Batch analysis');
+  }
+
+  /**
+   * Score readings and aggregate them into fixed-size time buckets
+   * @param {Array} readings - Sensor readings with a timestamp field
+   * @param {Number} bucketMs - Bucket size in milliseconds
+   * @returns {Promise<Object>} Per-bucket aggregates, a sample of predictions and the model version
+   */
+  async aggregateBuckets(readings, bucketMs) {
+    return this.runPythonCommand('aggregate_buckets', { bucket_ms: bucketMs, readings }, 'Bucket aggregation');
+  }
+
+  /**
+   * Score the parts of an analysis window that the cache does not cover
+   * @param {String} patientId - Patient ID
+   * @param {Object} window - start, firstFull and settledThrough timestamps in ms
+   * @param {Object|null} cache - Cached document to extend, or null to score everything
+   * @param {Number} bucketMs - Bucket size in milliseconds
+   * @returns {Promise<Object>} Cached buckets used, coverage bounds, reading count and scored buckets
+   */
+  async scoreUncachedReadings(patientId, { start, firstFull, settledThrough }, cache, bucketMs) {
+    let cachedBuckets = [];
+    let coveredFrom = firstFull;
+    let coveredThrough = firstFull;
+    let usedCache = false;
+
+    // The cache is only reusable when it can be extended contiguously
+    if (cache && cache.coveredFrom && cache.coveredThrough) {
+      const from = cache.coveredFrom.getTime();
+      const through = cache.coveredThrough.getTime();
+      if (through >= firstFull && from <= settledThrough) {
+        coveredFrom = from;
+        coveredThrough = through;
+        cachedBuckets = cache.toObject({ flattenMaps: true }).buckets;
+        usedCache = true;
+      }
+    }
+
+    const headEnd = Math.max(firstFull, coveredFrom);
+    const tailStart = Math.max(coveredThrough, headEnd);
+    const rangeQuery = headEnd < tailStart
+      ? { $or: [
+          { recordedAt: { $gte: new Date(start), $lt: new Date(headEnd) } },
+          { recordedAt: { $gte: new Date(tailStart) } }
+        ] }
+      : { recordedAt: { $gte: new Date(start) } };
+
+    const sensorData = await SensorData.find({ userId: patientId, ...rangeQuery })
+      .sort({ recordedAt: -1 });
+
+    const readings = sensorData.map(data => this.toReading(data));
+
+    // Always run, even with no readings, so Python reports the model it loaded
+    const scored = await this.aggregateBuckets(readings, bucketMs);
+
+    return {
+      usedCache,
+      cachedBuckets,
+      coveredFrom,
+      scoredReadings: readings.length,
+      scored
+    };
+  }
+
+  /**
+   * Analyze a patient's readings since startDate, reusing cached bucket aggregates.
+   * Only readings in the partial first bucket, in buckets not yet cached and in
+   * buckets that are not yet settled are scored; settled buckets are persisted.
+   * @param {String} patientId - Patient ID
+   * @param {Date} startDate - Start of the analysis window
+   * @param {Object} options - bucketMs, retentionMs and syncLagMs overrides
+   * @returns {Promise<Object>} Analysis with the same fields as analyzeBatch
+   */
+  async analyzeIncremental(patientId, startDate, options = {}) {
+    const bucketMs = options.bucketMs || 60 * 60 * 1000;
+    const retentionMs = options.retentionMs || 31 * 24 * 60 * 60 * 1000;
+    // Readings are stamped with ThingSpeak created_at but synced every few minutes,
+    // so a bucket is only final once it ended at least syncLagMs ago
+    const syncLagMs = options.syncLagMs ?? 10 * 60 * 1000;
+
+    const now = Date.now();
+    const start = startDate.getTime();
+    const firstFull = Math.ceil(start / bucketMs) * bucketMs;
+    const settledThrough = Math.floor((now - syncLagMs) / bucketMs) * bucketMs;
+    const cacheable = firstFull < settledThrough;
+    const window = { start, firstFull, settledThrough };
+
+    const cache = cacheable
+      ? await MLAnalysisCache.findOne({ userId: patientId, bucketMs })
+      : null;
+
+    let attempt = await this.scoreUncachedReadings(patientId, window, cache, bucketMs);
+    if (attempt.usedCache && attempt.scored.model_version !== cache.modelVersion) {
+      // Cached aggregates came from a different model than the one ml_predictor.py loaded
+      attempt = await this.scoreUncachedReadings(patientId, window, null, bucketMs);
+    }
+
+    const { cachedBuckets, coveredFrom, scored } = attempt;
+    const newBuckets = scored.buckets.map(bucket => ({
+      start: new Date(bucket.start),
+      count: bucket.count,
+      anomalyCount: bucket.anomaly_count,
+      riskSum: bucket.risk_sum,
+      riskMin: bucket.risk_min,
+      riskMax: bucket.risk_max,
+      severityCounts: bucket.severity_counts,
+      driverSums: bucket.driver_sums
+    }));
+
+    if (cacheable) {
+      const retainFrom = Math.floor((now - retentionMs) / bucketMs) * bucketMs;
+      const settled = newBuckets.filter(bucket =>
+        bucket.start.getTime() >= firstFull && bucket.start.getTime() < settledThrough
+      );
+      const stored = cachedBuckets
+        .concat(settled)
+        .filter(bucket => new Date(bucket.start).getTime() >= retainFrom)
+        .sort((a, b) => new Date(a.start) - new Date(b.start));
+
+      await MLAnalysisCache.findOneAndUpdate(
+        { userId: patientId, bucketMs },
+        {
+          modelVersion: scored.model_version,
+          coveredFrom: new Date(Math.max(Math.min(coveredFrom, firstFull), retainFrom)),
+          coveredThrough: new Date(settledThrough),
+          buckets: stored,
+          updatedAt: new Date()
+        },
+        { upsert: true }
+      );
+    }
+
+    const windowBuckets = cachedBuckets
+      .filter(bucket => {
+        const bucketStart = new Date(bucket.start).getTime();
+        return bucketStart >= firstFull && bucketStart < settledThrough;
+      })
+      .concat(newBuckets);
+
+    return {
+      ...this.combineBuckets(windowBuckets),
+      predictions: scored.predictions,
+      incremental: {
+        model_version: scored.model_version,
+        bucket_ms: bucketMs,
+        cached_buckets: windowBuckets.length - newBuckets.length,
+        scored_readings: attempt.scoredReadings
+      }
+    };
+  }
+
+  /**
+   * Merge partial bucket aggregates into the analyzeBatch summary shape
+   * @param {Array} buckets - Bucket aggregates
+   * @returns {Object} Combined statistics
+   */
+  combineBuckets(buckets) {
+    const total = {
+      count: 0,
+      anomalyCount: 0,
+      riskSum: 0,
+      riskMin: Infinity,
+      riskMax: -Infinity,
+      severityCounts: Object.fromEntries(SEVERITY_LEVELS.map(level => [level, 0])),
+      driverSums: {}
+    };
+
+    buckets.forEach(bucket => {
+      total.count += bucket.count;
+      total.anomalyCount += bucket.anomalyCount;
+      total.riskSum += bucket.riskSum;
+      total.riskMin = Math.min(total.riskMin, bucket.riskMin);
+      total.riskMax = Math.max(total.riskMax, bucket.riskMax);
+      SEVERITY_LEVELS.forEach(level => {
+        total.severityCounts[level] += bucket.severityCounts?.[level] || 0;
+      });
+      Object.entries(bucket.driverSums || {}).forEach(([feature, sum]) => {
+        total.driverSums[feature] = (total.driverSums[feature] || 0) + sum;
+      });
     });
+
+    const anomalyDrivers = Object.entries(total.driverSums)
+      .map(([feature, sum]) => ({ feature, contribution: sum / Math.max(total.anomalyCount, 1) }))
+      .filter(driver => driver.contribution > 0)
+      .sort((a, b) => b.contribution - a.contribution);
+
+    return {
+      total_readings: total.count,
+      anomaly_count: total.anomalyCount,
+      anomaly_rate: total.count ? total.anomalyCount / total.count : 0,
+      average_risk: total.count ? total.riskSum / total.count : 0,
+      max_risk: total.count ? total.riskMax : 0,
+      min_risk: total.count ? total.riskMin : 0,
+      critical_count: total.severityCounts.critical,
+      high_count: total.severityCounts.high,
+      severity_counts: total.severityCounts,
+      anomaly_drivers: anomalyDrivers
+    };
+  }
+
+  /**
+   * Compare recent readings against the training distribution
+   * @param {Array} readings - Readings with patient_id and timestamp fields
+   * @returns {Promise<Object>} Global and per-patient drift scores plus alarms
+   */
+  async driftReport(readings) {
+    return this.runPythonCommand('drift_report', readings, 'Drift report');
+  }
+
+  /**
+   * Score a large batch of readings using the compact encoded output
+   * @param {Array} readings - Array of vital sign objects
+   * @param {Object} options - decode: false returns the base64 payload untouched
+   * @returns {Promise<Object>} Encoded or decoded arrays plus shared lookup tables
+   */
+  async predictBatchCompact(readings, { decode = true } = {}) {
+    const result = await this.runPythonCommand('predict_batch_compact', readings, 'Compact batch prediction');
+    return decode ? this.decodeCompactResult(result) : result;
+  }
+
+  /**
+   * Decode base64 little-endian arrays from the compact format into typed arrays
+   * @param {Object} result - Compact result from ml_predictor.py
+   * @returns {Object} Result with typed arrays in place of encoded strings
+   */
+  decodeCompactResult(result) {
+    if (result.encoding !== 'base64') {
+      return result;
+    }
+
+    const decode = (encoded, ArrayType) => {
+      // Copy into a fresh buffer so typed array views are correctly aligned
+      const bytes = Uint8Array.from(Buffer.from(encoded, 'base64'));
+      return new ArrayType(bytes.buffer);
+    };
+
+    return {
+      ...result,
+      encoding: 'typed',
+      is_anomaly: decode(result.is_anomaly, Uint8Array),
+      anomaly_mask: decode(result.anomaly_mask, Uint8Array),
+      severity: decode(result.severity, Uint8Array),
+      anomaly_score: decode(result.anomaly_score, Float32Array),
+      risk_score: decode(result.risk_score, Float32Array)
+    };
+  }
+
+  /**
+   * Summarize a decoded compact result in the analyzeBatch shape
+   * @param {Object} compact - Decoded compact result
+   * @returns {Object} Batch statistics
+   */
+  summarizeCompact(compact) {
+    const count = compact.count;
+    let anomalyCount = 0;
+    let riskSum = 0;
+    let maxRisk = -Infinity;
+    let minRisk = Infinity;
+    const severityCounts = compact.severity_levels.map(() => 0);
+
+    for (let i = 0; i < count; i++) {
+      anomalyCount += compact.is_anomaly[i];
+      riskSum += compact.risk_score[i];
+      maxRisk = Math.max(maxRisk, compact.risk_score[i]);
+      minRisk = Math.min(minRisk, compact.risk_score[i]);
+      severityCounts[compact.severity[i]] += 1;
+    }
+
+    const severityIndex = level => compact.severity_levels.indexOf(level);
+
+    return {
+      total_readings: count,
+      anomaly_count: anomalyCount,
+      anomaly_rate: count ? anomalyCount / count : 0,
+      average_risk: count ? riskSum / count : 0,
+      max_risk: count ? maxRisk : 0,
+      min_risk: count ? minRisk : 0,
+      critical_count: severityCounts[severityIndex('critical')],
+      high_count: severityCounts[severityIndex('high')]
+    };
+  }
+
+  /**
+   * Expand one row of a decoded compact result into the verbose prediction shape
+   * @param {Object} compact - Decoded compact result
+   * @param {Number} index - Row index
+   * @returns {Object} Prediction with named anomaly types and recommendations
+   */
+  expandCompactRow(compact, index) {
+    const mask = compact.anomaly_mask[index];
+    const severityCode = compact.severity[index];
+    const anomalyTypes = compact.anomaly_types.filter((_, bit) => (mask >> bit) & 1);
+
+    return {
+      is_anomaly: compact.is_anomaly[index] === 1,
+      anomaly_score: compact.anomaly_score[index],
+      risk_score: compact.risk_score[index],
+      severity: compact.severity_levels[severityCode],
+      anomaly_types: anomalyTypes.length > 0 ? anomalyTypes : ['none'],
+      recommendations: compact.recommendations[`${mask}:${severityCode}`] || []
+    };
   }
 
   /**
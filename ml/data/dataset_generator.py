@@ -1,12 +1,18 @@
+import os
+import sys
 import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
 import random
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from models.ecg_features import ECGFeatureExtractor, synthesize_ecg
 
 class HealthDataGenerator:
-    def __init__(self, num_samples=10000, anomaly_rate=0.3):
+    def __init__(self, num_samples=10000, anomaly_rate=0.3, ecg_sampling_rate=None, ecg_strip_seconds=10):
         self.num_samples = num_samples
         self.anomaly_rate = anomaly_rate
+        self.ecg_sampling_rate = ecg_sampling_rate
+        self.ecg_strip_seconds = ecg_strip_seconds
         self.start_time = datetime.now() - timedelta(days=30)
         
     def generate_normal_vitals(self, timestamp_hour):
@@ -143,13 +149,39 @@ class HealthDataGenerator:
                         df.loc[patient_data.index[i], 'activity_level'] = 'moderate'
         
         return df
+    
+    def add_ecg_features(self, df):
+        extractor = ECGFeatureExtractor(sampling_rate=self.ecg_sampling_rate)
+        chunk_size = self.ecg_sampling_rate
+        rows = []
+        
+        for heart_rate, anomaly_type in zip(df['heart_rate'], df['anomaly_type']):
+            strip = synthesize_ecg(
+                heart_rate,
+                duration=self.ecg_strip_seconds,
+                sampling_rate=self.ecg_sampling_rate,
+                irregular=anomaly_type == 'irregular_pattern'
+            )
+            
+            extractor.reset('strip')
+            for start in range(0, len(strip), chunk_size):
+                extractor.process_chunk('strip', strip[start:start + chunk_size])
+            rows.append(extractor.get_features('strip'))
+        
+        features = pd.DataFrame(rows, index=df.index)
+        return pd.concat([df, features], axis=1)
 
 if __name__ == "__main__":
+    # --ecg adds per-reading ECG summary features (ecg_hr, ecg_sdnn, ...) from synthetic strips
+    use_ecg = '--ecg' in sys.argv[1:]
     print("Generating synthetic health monitoring dataset...")
     
-    generator = HealthDataGenerator(num_samples=10000, anomaly_rate=0.3)
+    generator = HealthDataGenerator(num_samples=10000, anomaly_rate=0.3,
+                                    ecg_sampling_rate=250 if use_ecg else None)
     df = generator.generate_dataset()
     df = generator.add_realistic_patterns(df)
+    if use_ecg:
+        df = generator.add_ecg_features(df)
     
     df.to_csv('/Users/garvitsharma/Desktop/projects/Thappar/ml/data/synthetic_health_data.csv', index=False)
     
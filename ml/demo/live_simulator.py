@@ -7,11 +7,18 @@ from datetime import datetime, timedelta
 import joblib
 sys.path.append('/Users/garvitsharma/Desktop/projects/Thappar/ml')
 from models.anomaly_detector import HealthAnomalyDetector
+from models.ecg_features import ECGFeatureExtractor, ECGSynthesizer
+from models.drift_monitor import DriftMonitor
 
 class LiveHealthSimulator:
-    def __init__(self, model_path='/Users/garvitsharma/Desktop/projects/Thappar/ml/models/health_anomaly_model.pkl'):
+    def __init__(self, model_path='/Users/garvitsharma/Desktop/projects/Thappar/ml/models/health_anomaly_model.pkl',
+                 band_id='SIM_BAND', ecg_sampling_rate=250):
         self.detector = HealthAnomalyDetector()
         self.detector.load_model(model_path)
+        self.drift_monitor = self.detector.attach_drift_monitor(DriftMonitor.from_detector(self.detector))
+        self.band_id = band_id
+        self.ecg_extractor = ECGFeatureExtractor(sampling_rate=ecg_sampling_rate)
+        self.ecg_synthesizer = ECGSynthesizer(sampling_rate=ecg_sampling_rate)
         self.current_state = 'normal'
         self.transition_counter = 0
         self.anomaly_scenarios = [
@@ -101,6 +108,21 @@ class LiveHealthSimulator:
         
         return vitals
     
+    def stream_ecg(self, vitals, seconds):
+        irregular = self.current_state != 'normal' and self.current_scenario == 'panic_attack'
+        waveform = self.ecg_synthesizer.next_strip(
+            vitals['heart_rate'],
+            duration=seconds,
+            irregular=irregular
+        )
+        
+        chunk_size = self.ecg_extractor.sampling_rate
+        for start in range(0, len(waveform), chunk_size):
+            self.ecg_extractor.process_chunk(self.band_id, waveform[start:start + chunk_size])
+        
+        vitals.update(self.ecg_extractor.get_features(self.band_id))
+        return vitals
+    
     def format_vitals_display(self, vitals, prediction):
         severity_colors = {
             'critical': '🔴',
@@ -154,6 +176,7 @@ class LiveHealthSimulator:
                 reading_count += 1
                 
                 vitals = self.generate_next_reading()
+                vitals = self.stream_ecg(vitals, update_interval)
                 
                 prediction = self.detector.predict(vitals)
                 
@@ -171,6 +194,10 @@ class LiveHealthSimulator:
                             print(f"   • {rec}")
                 
                 print(f"\n📊 Statistics: Readings: {reading_count} | Anomalies: {anomalies_detected}")
+                if prediction['drift_alarm']:
+                    drift = self.drift_monitor.drift_scores()
+                    drifted = [name for name, f in drift['features'].items() if f['alarm']]
+                    print(f"📉 Input drift vs training data: {', '.join(drifted)}")
                 print(f"⏱️  Simulation Time: {int(time.time() - start_time)}s / {duration_seconds}s")
                 
                 time.sleep(update_interval)
@@ -187,5 +214,11 @@ class LiveHealthSimulator:
         print(f"Duration: {int(time.time() - start_time)} seconds")
 
 if __name__ == "__main__":
-    simulator = LiveHealthSimulator()
+    # --ecg runs the model trained with `anomaly_detector.py --ecg` on the streamed ECG features
+    if '--ecg' in sys.argv[1:]:
+        simulator = LiveHealthSimulator(
+            model_path='/Users/garvitsharma/Desktop/projects/Thappar/ml/models/health_anomaly_model_ecg.pkl'
+        )
+    else:
+        simulator = LiveHealthSimulator()
     simulator.run_simulation(duration_seconds=120, update_interval=2)
\ No newline at end of file
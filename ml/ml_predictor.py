@@ -1,4 +1,5 @@
 #!/usr/bin/env python
+import os
 import sys
 import json
 import joblib
@@ -9,7 +10,25 @@ warnings.filterwarnings('ignore')
 
 # Add the ml directory to path
 sys.path.append('/Users/garvitsharma/Desktop/projects/Thappar/ml')
-from models.anomaly_detector import HealthAnomalyDetector
+from models.anomaly_detector import HealthAnomalyDetector, SEVERITY_LEVELS
+from models.forest_explainer import ForestExplainer
+from models.drift_monitor import DriftMonitor
+
+MODEL_PATH = '/Users/garvitsharma/Desktop/projects/Thappar/ml/models/health_anomaly_model.pkl'
+
+def model_version(path=MODEL_PATH):
+    """Identify the model file actually loaded, for cache invalidation"""
+    stats = os.stat(path)
+    return f"{stats.st_size}-{stats.st_mtime_ns // 10**6}"
+
+def readings_frame(detector, readings):
+    """Build a DataFrame of readings with missing vital sign columns filled with 0"""
+    df = pd.DataFrame(readings)
+    for column in detector.feature_columns:
+        if column not in df:
+            df[column] = 0
+    df[detector.feature_columns] = df[detector.feature_columns].fillna(0)
+    return df
 
 def predict_single(vital_signs_json):
     """Make a single prediction for given vital signs"""
@@ -18,7 +37,7 @@ def predict_single(vital_signs_json):
         
         # Load the trained model
         detector = HealthAnomalyDetector()
-        detector.load_model('/Users/garvitsharma/Desktop/projects/Thappar/ml/models/health_anomaly_model.pkl')
+        detector.load_model(MODEL_PATH)
         
         # Make prediction
         result = detector.predict(vital_signs)
@@ -54,13 +73,14 @@ def analyze_batch(historical_data_json):
         
         # Load the trained model
         detector = HealthAnomalyDetector()
-        detector.load_model('/Users/garvitsharma/Desktop/projects/Thappar/ml/models/health_anomaly_model.pkl')
+        detector.load_model(MODEL_PATH)
         
         # Convert to DataFrame
         df = pd.DataFrame(historical_data)
         
         # Make batch predictions
         predictions = []
+        readings = []
         for _, row in df.iterrows():
             vital_signs = {
                 'heart_rate': row.get('heart_rate', 0),
@@ -71,6 +91,7 @@ def analyze_batch(historical_data_json):
                 'ecg': row.get('ecg', 0)
             }
             
+            readings.append(vital_signs)
             result = detector.predict(vital_signs)
             predictions.append({
                 'is_anomaly': bool(result['is_anomaly']),
@@ -78,6 +99,25 @@ def analyze_batch(historical_data_json):
                 'severity': result['severity']
             })
         
+        # Explain every flagged reading in one vectorized pass over the forest
+        flagged = [i for i, p in enumerate(predictions) if p['is_anomaly']]
+        anomaly_drivers = []
+        if flagged:
+            X = detector.prepare_features(pd.DataFrame([readings[i] for i in flagged]))
+            # Readings above are scored one at a time, so match single-reading features
+            X['hr_variance'] = 0.0
+            explainer = ForestExplainer.from_detector(detector)
+            contributions, _ = explainer.explain(detector.scaler.transform(X))
+            
+            for i, explanation in zip(flagged, explainer.top_features(contributions)):
+                predictions[i]['explanation'] = explanation
+            
+            mean_contributions = contributions.mean(axis=0)
+            anomaly_drivers = [
+                {'feature': explainer.feature_names[i], 'contribution': float(mean_contributions[i])}
+                for i in np.argsort(-mean_contributions) if mean_contributions[i] > 0
+            ]
+        
         # Calculate statistics
         anomaly_count = sum(1 for p in predictions if p['is_anomaly'])
         risk_scores = [p['risk_score'] for p in predictions]
@@ -91,6 +131,7 @@ def analyze_batch(historical_data_json):
             'min_risk': min(risk_scores) if risk_scores else 0,
             'critical_count': sum(1 for p in predictions if p['severity'] == 'critical'),
             'high_count': sum(1 for p in predictions if p['severity'] == 'high'),
+            'anomaly_drivers': anomaly_drivers,
             'predictions': predictions[:10]  # Return first 10 predictions as sample
         }
         
@@ -106,18 +147,167 @@ def analyze_batch(historical_data_json):
         print(json.dumps(error_response))
         sys.exit(1)
 
+def aggregate_buckets(payload_json):
+    """Score readings and return mergeable per-time-bucket aggregates"""
+    try:
+        payload = json.loads(payload_json)
+        bucket_ms = int(payload['bucket_ms'])
+        
+        # Load the trained model
+        detector = HealthAnomalyDetector()
+        detector.load_model(MODEL_PATH)
+        version = model_version()
+        
+        df = readings_frame(detector, payload['readings'])
+        if len(df) == 0:
+            print(json.dumps({
+                'bucket_ms': bucket_ms, 'model_version': version, 'buckets': [], 'predictions': []
+            }))
+            return
+        
+        # Same per-reading semantics as analyze_batch, scored in one vectorized pass
+        scores = detector.score_batch(df, independent=True)
+        is_anomaly = scores['is_anomaly'].astype(bool)
+        risk = scores['risk_score'].astype(float)
+        severity = scores['severity']
+        
+        timestamps = (pd.to_datetime(df['timestamp'], utc=True) - pd.Timestamp(0, tz='UTC')) // pd.Timedelta(milliseconds=1)
+        bucket_starts, inverse = np.unique(timestamps.values // bucket_ms * bucket_ms, return_inverse=True)
+        n_buckets = len(bucket_starts)
+        
+        counts = np.bincount(inverse, minlength=n_buckets)
+        anomaly_counts = np.bincount(inverse, weights=is_anomaly, minlength=n_buckets)
+        risk_sums = np.bincount(inverse, weights=risk, minlength=n_buckets)
+        risk_min = np.full(n_buckets, np.inf)
+        risk_max = np.full(n_buckets, -np.inf)
+        np.minimum.at(risk_min, inverse, risk)
+        np.maximum.at(risk_max, inverse, risk)
+        severity_counts = np.bincount(inverse * 4 + severity, minlength=n_buckets * 4).reshape(n_buckets, 4)
+        
+        explainer = ForestExplainer.from_detector(detector)
+        driver_sums = np.zeros((n_buckets, len(explainer.feature_names)))
+        explanations = {}
+        flagged = np.flatnonzero(is_anomaly)
+        if len(flagged):
+            X = detector.prepare_features(df.iloc[flagged])
+            X['hr_variance'] = 0.0
+            contributions, _ = explainer.explain(detector.scaler.transform(X))
+            np.add.at(driver_sums, inverse[flagged], contributions)
+            for i in flagged[flagged < 10]:
+                explanations[i] = explainer.top_features(contributions[flagged == i])[0]
+        
+        buckets = []
+        for b in range(n_buckets):
+            buckets.append({
+                'start': int(bucket_starts[b]),
+                'count': int(counts[b]),
+                'anomaly_count': int(anomaly_counts[b]),
+                'risk_sum': float(risk_sums[b]),
+                'risk_min': float(risk_min[b]),
+                'risk_max': float(risk_max[b]),
+                'severity_counts': dict(zip(SEVERITY_LEVELS, severity_counts[b].tolist())),
+                'driver_sums': dict(zip(explainer.feature_names, driver_sums[b].tolist()))
+            })
+        
+        predictions = []
+        for i in range(min(len(df), 10)):
+            prediction = {
+                'is_anomaly': bool(is_anomaly[i]),
+                'risk_score': float(risk[i]),
+                'severity': SEVERITY_LEVELS[severity[i]]
+            }
+            if i in explanations:
+                prediction['explanation'] = explanations[i]
+            predictions.append(prediction)
+        
+        print(json.dumps({
+            'bucket_ms': bucket_ms, 'model_version': version, 'buckets': buckets, 'predictions': predictions
+        }))
+        
+    except Exception as e:
+        error_response = {
+            'error': str(e),
+            'buckets': []
+        }
+        print(json.dumps(error_response))
+        sys.exit(1)
+
+def drift_report(readings_json):
+    """Replay stored readings through a drift monitor and report drift per patient"""
+    try:
+        readings = json.loads(readings_json)
+        
+        # Load the trained model
+        detector = HealthAnomalyDetector()
+        detector.load_model(MODEL_PATH)
+        
+        # Each call is a fresh process, so the monitor is rebuilt from the readings sent
+        monitor = DriftMonitor.from_detector(detector)
+        
+        df = readings_frame(detector, readings)
+        if len(df) > 0:
+            if 'timestamp' in df:
+                df = df.sort_values('timestamp')
+            
+            patient_ids = df['patient_id'].astype(str).values if 'patient_id' in df else None
+            monitor.update(detector.prepare_features(df).values, patient_ids)
+        
+        report = monitor.get_report()
+        report['alarms'] = monitor.alarms()
+        print(json.dumps(report))
+        
+    except Exception as e:
+        error_response = {
+            'error': str(e),
+            'global': None,
+            'patients': {},
+            'alarms': []
+        }
+        print(json.dumps(error_response))
+        sys.exit(1)
+
+def predict_batch_compact(batch_data_json):
+    """Score a batch of readings and return the compact encoded format"""
+    try:
+        batch_data = json.loads(batch_data_json)
+        
+        # Load the trained model
+        detector = HealthAnomalyDetector()
+        detector.load_model(MODEL_PATH)
+        
+        df = readings_frame(detector, batch_data)
+        
+        # Score each reading on its own, as predict and analyze_batch do
+        print(json.dumps(detector.predict_compact(df, independent=True), separators=(',', ':')))
+        
+    except Exception as e:
+        error_response = {
+            'error': str(e),
+            'format': 'compact',
+            'count': 0
+        }
+        print(json.dumps(error_response))
+        sys.exit(1)
+
 def main():
-    if len(sys.argv) < 3:
+    if len(sys.argv) < 2:
         print(json.dumps({'error': 'Invalid arguments'}))
         sys.exit(1)
     
     command = sys.argv[1]
-    data = sys.argv[2]
+    # Large batches are sent on stdin; a single argv string is capped at 128 KiB on Linux
+    data = sys.argv[2] if len(sys.argv) > 2 else sys.stdin.read()
     
     if command == 'predict':
         predict_single(data)
     elif command == 'analyze_batch':
         analyze_batch(data)
+    elif command == 'aggregate_buckets':
+        aggregate_buckets(data)
+    elif command == 'drift_report':
+        drift_report(data)
+    elif command == 'predict_batch_compact':
+        predict_batch_compact(data)
     else:
         print(json.dumps({'error': f'Unknown command: {command}'}))
         sys.exit(1)
@@ -4,12 +4,31 @@ from sklearn.ensemble import IsolationForest
 from sklearn.preprocessing import StandardScaler
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import classification_report, confusion_matrix
+import base64
 import joblib
+from models.ecg_features import ECG_FEATURE_COLUMNS
 import warnings
 warnings.filterwarnings('ignore')
 
+# Bit i of a compact anomaly mask is set when ANOMALY_TYPES[i] was detected
+ANOMALY_TYPES = [
+    'bradycardia', 'tachycardia', 'hypoxia', 'fever',
+    'hypertension', 'hypotension'
+]
+
+SEVERITY_LEVELS = ['low', 'medium', 'high', 'critical']
+
+RECOMMENDATIONS = {
+    'bradycardia': "Monitor for dizziness or fatigue. Consider ECG evaluation.",
+    'tachycardia': "Check for dehydration or anxiety. Monitor continuously.",
+    'hypoxia': "URGENT: Check oxygen supplementation. Monitor respiratory status.",
+    'fever': "Administer antipyretics. Monitor temperature trends.",
+    'hypertension': "Review medications. Check for stress factors.",
+    'hypotension': "Ensure adequate hydration. Monitor for syncope."
+}
+
 class HealthAnomalyDetector:
-    def __init__(self, contamination=0.3):
+    def __init__(self, contamination=0.3, use_ecg_features=False):
         self.contamination = contamination
         self.scaler = StandardScaler()
         self.model = IsolationForest(
@@ -23,6 +42,12 @@ class HealthAnomalyDetector:
             'heart_rate', 'spo2', 'temperature', 
             'bp_systolic', 'bp_diastolic', 'ecg'
         ]
+        # Computed by prepare_features, in the order they are appended
+        self.derived_feature_columns = ['hr_variance', 'bp_ratio', 'vitals_composite']
+        # Summary features computed upstream from raw waveforms by ECGFeatureExtractor
+        self.ecg_feature_columns = list(ECG_FEATURE_COLUMNS) if use_ecg_features else []
+        # Optional models/drift_monitor.py DriftMonitor, updated on every predict call
+        self.drift_monitor = None
         self.thresholds = {
             'heart_rate': {'min': 60, 'max': 100},
             'spo2': {'min': 95, 'max': 100},
@@ -31,6 +56,9 @@ class HealthAnomalyDetector:
             'bp_diastolic': {'min': 60, 'max': 90}
         }
         
+    def feature_names(self):
+        return self.feature_columns + self.derived_feature_columns + self.ecg_feature_columns
+    
     def prepare_features(self, df):
         features = df[self.feature_columns].copy()
         
@@ -42,6 +70,14 @@ class HealthAnomalyDetector:
             abs(features['temperature'] - 98.6)
         )
         
+        missing = [column for column in self.ecg_feature_columns if column not in df]
+        if missing:
+            raise ValueError(
+                f"Model was trained with ECG features but readings are missing: {', '.join(missing)}"
+            )
+        for column in self.ecg_feature_columns:
+            features[column] = df[column]
+        
         return features
     
     def train(self, df):
@@ -67,6 +103,10 @@ class HealthAnomalyDetector:
                                    target_names=['Normal', 'Anomaly']))
         
         cm = confusion_matrix(y_test, predictions)
+        
+        return self.summarize_confusion_matrix(cm)
+    
+    def summarize_confusion_matrix(self, cm):
         print("\nConfusion Matrix:")
         print(f"True Negatives: {cm[0,0]}")
         print(f"False Positives: {cm[0,1]}")
@@ -87,6 +127,88 @@ class HealthAnomalyDetector:
             'specificity': specificity
         }
     
+    def _iter_feature_chunks(self, path, chunksize, test_size, random_state):
+        # hr_variance is a 3-row rolling window, so carry the last rows across chunk boundaries
+        tail = None
+        for chunk_index, chunk in enumerate(pd.read_csv(path, chunksize=chunksize)):
+            context = chunk if tail is None else pd.concat([tail, chunk])
+            X = self.prepare_features(context).iloc[len(context) - len(chunk):]
+            tail = chunk.iloc[-2:]
+            
+            # Seeded per chunk so every pass assigns the same rows to the holdout
+            rng = np.random.RandomState(random_state + chunk_index)
+            is_test = rng.random_sample(len(chunk)) < test_size
+            
+            yield X.values.astype(float), chunk['is_anomaly'].values.astype(int), is_test
+    
+    def _sample_training_rows(self, path, chunksize, test_size, reservoir_size, random_state):
+        # Pass one: fit the scaler incrementally and keep a uniform reservoir of training rows
+        self.scaler = StandardScaler()
+        rng = np.random.RandomState(random_state)
+        reservoir = None
+        seen = 0
+        
+        for X, y, is_test in self._iter_feature_chunks(path, chunksize, test_size, random_state):
+            X_train = X[~is_test]
+            if len(X_train) == 0:
+                continue
+            
+            self.scaler.partial_fit(X_train)
+            
+            if reservoir is None:
+                reservoir = np.empty((reservoir_size, X_train.shape[1]))
+            
+            # Vectorized Algorithm R: row i replaces slot j ~ U[0, i] when j < reservoir_size
+            positions = seen + np.arange(len(X_train))
+            slots = np.where(
+                positions < reservoir_size,
+                positions,
+                (rng.random_sample(len(X_train)) * (positions + 1)).astype(int)
+            )
+            accepted = np.flatnonzero(slots < reservoir_size)
+            # Several rows in a chunk can hit the same slot; the latest row must win
+            unique_slots, last = np.unique(slots[accepted][::-1], return_index=True)
+            reservoir[unique_slots] = X_train[accepted[len(accepted) - 1 - last]]
+            seen += len(X_train)
+        
+        if reservoir is None:
+            raise ValueError(f"No training rows found in {path}")
+        
+        return reservoir[:min(seen, reservoir_size)], seen
+    
+    def train_streaming(self, path, chunksize=100000, test_size=0.2,
+                        reservoir_size=None, random_state=42):
+        """Train from a CSV larger than memory using two chunked passes.
+        
+        Pass one fits the scaler from running statistics and keeps a uniform
+        reservoir sample of training rows for the forest. Pass two scores the
+        holdout rows and accumulates the confusion matrix.
+        """
+        print("Training anomaly detection model (streaming)...")
+        
+        if reservoir_size is None:
+            reservoir_size = self.model.n_estimators * 256
+        
+        reservoir, seen = self._sample_training_rows(path, chunksize, test_size,
+                                                     reservoir_size, random_state)
+        print(f"Fitting forest on {len(reservoir)} reservoir samples from {seen} training rows")
+        self.model.fit(self.scaler.transform(reservoir))
+        
+        cm = np.zeros((2, 2), dtype=int)
+        for X, y, is_test in self._iter_feature_chunks(path, chunksize, test_size, random_state):
+            if not is_test.any():
+                continue
+            
+            predictions = self.model.predict(self.scaler.transform(X[is_test]))
+            predictions = (predictions == -1).astype(int)
+            cm += np.bincount(2 * y[is_test] + predictions, minlength=4).reshape(2, 2)
+        
+        print("\nModel Performance:")
+        print("=" * 50)
+        print(f"Holdout rows: {cm.sum()}")
+        
+        return self.summarize_confusion_matrix(cm)
+    
     def predict(self, data):
         if isinstance(data, dict):
             df = pd.DataFrame([data])
@@ -96,6 +218,10 @@ class HealthAnomalyDetector:
         X = self.prepare_features(df)
         X_scaled = self.scaler.transform(X)
         
+        if self.drift_monitor is not None:
+            patient_ids = df['patient_id'].values if 'patient_id' in df else None
+            self.drift_monitor.update(X.values, patient_ids)
+        
         anomaly_score = self.model.score_samples(X_scaled)
         
         prediction = self.model.predict(X_scaled)
@@ -119,8 +245,115 @@ class HealthAnomalyDetector:
             'recommendations': self.get_recommendations(anomaly_types, severity)
         }
         
+        if self.drift_monitor is not None:
+            result['drift_alarm'] = self.drift_monitor.drift_scores()['alarm']
+        
         return result
     
+    def predict_compact(self, data, encoding='base64', independent=False):
+        """Batch prediction encoded as per-row bitmasks, severity codes and float32 scores.
+        
+        Recommendations are returned once per distinct (mask, severity) pair,
+        keyed as "<mask>:<severity_code>", instead of once per row.
+        """
+        if encoding not in ('base64', 'list'):
+            raise ValueError(f"Unknown encoding '{encoding}', expected 'base64' or 'list'")
+        
+        df = pd.DataFrame([data]) if isinstance(data, dict) else data
+        arrays = self.score_batch(df, independent=independent)
+        
+        pairs = np.unique(arrays['anomaly_mask'].astype(np.uint16) << 2 | arrays['severity'])
+        recommendations = {
+            f"{pair >> 2}:{pair & 3}": self.recommendations_for_mask(pair >> 2, pair & 3)
+            for pair in pairs.tolist()
+        }
+        
+        if encoding == 'base64':
+            arrays = {
+                key: base64.b64encode(value.astype(value.dtype.newbyteorder('<')).tobytes()).decode('ascii')
+                for key, value in arrays.items()
+            }
+        else:
+            arrays = {key: value.tolist() for key, value in arrays.items()}
+        
+        return {
+            'format': 'compact',
+            'encoding': encoding,
+            'count': len(df),
+            'anomaly_types': ANOMALY_TYPES,
+            'severity_levels': SEVERITY_LEVELS,
+            **arrays,
+            'recommendations': recommendations
+        }
+    
+    def score_batch(self, df, independent=False):
+        """Vectorized scores for a DataFrame of readings.
+        
+        With independent=True hr_variance is zeroed, matching what predict
+        returns when each reading is passed on its own.
+        """
+        X = self.prepare_features(df)
+        if independent:
+            X['hr_variance'] = 0.0
+        
+        anomaly_score = self.model.score_samples(self.scaler.transform(X))
+        severity_codes = self.calculate_severity_codes(df)
+        
+        severity_weight = np.array([0.25, 0.5, 0.75, 1.0])
+        risk_score = 100 / (1 + np.exp(anomaly_score)) * severity_weight[severity_codes]
+        
+        return {
+            'is_anomaly': (anomaly_score < self.model.offset_).astype(np.uint8),
+            'anomaly_mask': self.identify_anomaly_mask(df),
+            'severity': severity_codes,
+            'anomaly_score': anomaly_score.astype(np.float32),
+            'risk_score': risk_score.astype(np.float32)
+        }
+    
+    def calculate_severity_codes(self, df):
+        hr_deviation = np.abs(df['heart_rate'].values - 75) / 75
+        spo2 = df['spo2'].values
+        temperature = df['temperature'].values
+        systolic = df['bp_systolic'].values
+        diastolic = df['bp_diastolic'].values
+        
+        score = (
+            np.where(hr_deviation > 0.3, 2, np.where(hr_deviation > 0.2, 1, 0)) +
+            np.where(spo2 < 92, 3, np.where(spo2 < 95, 1, 0)) +
+            np.where(temperature > 100.5, 2, np.where(temperature > 99.5, 1, 0)) +
+            np.where((systolic > 140) | (diastolic > 90), 2,
+                     np.where((systolic > 130) | (diastolic > 85), 1, 0))
+        )
+        
+        return np.searchsorted([1, 3, 5], score, side='right').astype(np.uint8)
+    
+    def identify_anomaly_mask(self, df):
+        heart_rate = df['heart_rate'].values
+        systolic = df['bp_systolic'].values
+        
+        detected = [
+            heart_rate < self.thresholds['heart_rate']['min'],
+            heart_rate > self.thresholds['heart_rate']['max'],
+            df['spo2'].values < self.thresholds['spo2']['min'],
+            df['temperature'].values > self.thresholds['temperature']['max'],
+            systolic > self.thresholds['bp_systolic']['max'],
+            systolic < self.thresholds['bp_systolic']['min']
+        ]
+        
+        mask = np.zeros(len(df), dtype=np.uint8)
+        for bit, flags in enumerate(detected):
+            mask |= flags.astype(np.uint8) << bit
+        
+        return mask
+    
+    def recommendations_for_mask(self, mask, severity_code):
+        types = [t for bit, t in enumerate(ANOMALY_TYPES) if mask >> bit & 1]
+        return self.get_recommendations(types or ['none'], SEVERITY_LEVELS[severity_code])
+    
+    def attach_drift_monitor(self, monitor):
+        self.drift_monitor = monitor
+        return monitor
+    
     def calculate_severity(self, df):
         severity_scores = []
         
@@ -215,18 +448,9 @@ class HealthAnomalyDetector:
         else:
             types = anomaly_types if isinstance(anomaly_types, list) else [anomaly_types]
         
-        if 'bradycardia' in types:
-            recommendations.append("Monitor for dizziness or fatigue. Consider ECG evaluation.")
-        if 'tachycardia' in types:
-            recommendations.append("Check for dehydration or anxiety. Monitor continuously.")
-        if 'hypoxia' in types:
-            recommendations.append("URGENT: Check oxygen supplementation. Monitor respiratory status.")
-        if 'fever' in types:
-            recommendations.append("Administer antipyretics. Monitor temperature trends.")
-        if 'hypertension' in types:
-            recommendations.append("Review medications. Check for stress factors.")
-        if 'hypotension' in types:
-            recommendations.append("Ensure adequate hydration. Monitor for syncope.")
+        for anomaly_type in ANOMALY_TYPES:
+            if anomaly_type in types:
+                recommendations.append(RECOMMENDATIONS[anomaly_type])
         
         if severity in ['critical', 'high']:
             recommendations.insert(0, "IMMEDIATE MEDICAL ATTENTION REQUIRED")
@@ -238,6 +462,7 @@ class HealthAnomalyDetector:
             'model': self.model,
             'scaler': self.scaler,
             'feature_columns': self.feature_columns,
+            'ecg_feature_columns': self.ecg_feature_columns,
             'thresholds': self.thresholds,
             'contamination': self.contamination
         }
@@ -249,18 +474,29 @@ class HealthAnomalyDetector:
         self.model = model_data['model']
         self.scaler = model_data['scaler']
         self.feature_columns = model_data['feature_columns']
+        self.ecg_feature_columns = model_data.get('ecg_feature_columns', [])
         self.thresholds = model_data['thresholds']
         self.contamination = model_data['contamination']
         print(f"Model loaded from {path}")
 
 if __name__ == "__main__":
+    import sys
+    from models.ecg_features import ECGFeatureExtractor, synthesize_ecg
+
+    # --ecg trains on the ECG summary features too; the dataset must have been
+    # generated with --ecg. The backend does not send raw ECG yet, so the ECG
+    # model is saved separately and ml_predictor.py keeps using the default one.
+    use_ecg = '--ecg' in sys.argv[1:]
     df = pd.read_csv('/Users/garvitsharma/Desktop/projects/Thappar/ml/data/synthetic_health_data.csv')
     
-    detector = HealthAnomalyDetector(contamination=0.3)
+    detector = HealthAnomalyDetector(contamination=0.3, use_ecg_features=use_ecg)
     
     metrics = detector.train(df)
     
-    detector.save_model('/Users/garvitsharma/Desktop/projects/Thappar/ml/models/health_anomaly_model.pkl')
+    if use_ecg:
+        detector.save_model('/Users/garvitsharma/Desktop/projects/Thappar/ml/models/health_anomaly_model_ecg.pkl')
+    else:
+        detector.save_model('/Users/garvitsharma/Desktop/projects/Thappar/ml/models/health_anomaly_model.pkl')
     
     print("\n" + "="*50)
     print("Testing on sample data:")
@@ -284,6 +520,12 @@ if __name__ == "__main__":
         'ecg': 25
     }
     
+    if use_ecg:
+        extractor = ECGFeatureExtractor()
+        for band_id, sample, irregular in (('normal', normal_sample, False), ('anomaly', anomaly_sample, True)):
+            extractor.process_chunk(band_id, synthesize_ecg(sample['heart_rate'], irregular=irregular))
+            sample.update(extractor.get_features(band_id))
+    
     print("\nNormal Sample Prediction:")
     result = detector.predict(normal_sample)
     print(f"Is Anomaly: {result['is_anomaly']}")
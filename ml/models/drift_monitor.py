@@ -0,0 +1,162 @@
+import numpy as np
+
+GLOBAL_KEY = '__global__'
+
+
+class _RunningStats:
+    def __init__(self, n_features):
+        self.count = 0
+        self.mean = np.zeros(n_features)
+        self.var = np.zeros(n_features)
+
+
+class DriftMonitor:
+    """Online input-drift detection against the training distribution.
+
+    Running mean and variance are kept per patient and globally with a
+    Welford-style update. Once a stream has seen `window` readings the update
+    weight stops shrinking, so the statistics track the most recent readings
+    instead of freezing on old history. Each stream costs O(n_features) memory.
+
+    The global stream runs mean-shift and variance-ratio tests. Patient
+    streams only run the mean-shift test, since a single patient's spread is
+    naturally much narrower than the training population's.
+    """
+
+    def __init__(self, train_mean, train_var, feature_names, window=500,
+                 min_samples=30, z_threshold=5.0, effect_threshold=0.5,
+                 var_ratio_threshold=2.0, columns=None):
+        # columns selects the monitored features from each input row
+        self.columns = None if columns is None else np.asarray(columns)
+        self.train_mean = np.asarray(train_mean, dtype=float)
+        self.train_std = np.sqrt(np.maximum(np.asarray(train_var, dtype=float), 1e-12))
+        self.feature_names = list(feature_names)
+        self.window = window
+        self.min_samples = min_samples
+        self.z_threshold = z_threshold
+        self.effect_threshold = effect_threshold
+        self.log_var_threshold = np.log(var_ratio_threshold)
+        self.streams = {}
+
+    @classmethod
+    def from_scaler(cls, scaler, feature_names, exclude=(), **kwargs):
+        columns = [i for i, name in enumerate(feature_names) if name not in exclude]
+        return cls(
+            scaler.mean_[columns], scaler.var_[columns],
+            [feature_names[i] for i in columns], columns=columns, **kwargs
+        )
+
+    @classmethod
+    def from_detector(cls, detector, exclude=('hr_variance',), **kwargs):
+        # hr_variance is a rolling window over the scored batch, so it is always 0
+        # for single readings and reflects batch shape rather than input drift
+        return cls.from_scaler(detector.scaler, detector.feature_names(), exclude=exclude, **kwargs)
+
+    def _stream(self, key):
+        stats = self.streams.get(key)
+        if stats is None:
+            stats = _RunningStats(len(self.feature_names))
+            self.streams[key] = stats
+        return stats
+
+    def _merge(self, stats, count, mean, var):
+        # Chan et al. parallel update; reduces to Welford for a single reading
+        stats.count += count
+        alpha = count / min(stats.count, max(self.window, count))
+        delta = mean - stats.mean
+        stats.mean = stats.mean + alpha * delta
+        stats.var = (1 - alpha) * stats.var + alpha * var + alpha * (1 - alpha) * delta * delta
+
+    def update(self, X, patient_ids=None):
+        X = np.asarray(X, dtype=float)
+        if X.ndim == 1:
+            X = X[None, :]
+        if len(X) == 0:
+            return
+        if self.columns is not None:
+            X = X[:, self.columns]
+
+        # Readings with missing vitals (e.g. 0/0 bp_ratio) would poison the running stats
+        finite = np.isfinite(X).all(axis=1)
+        if not finite.all():
+            X = X[finite]
+            if patient_ids is not None:
+                patient_ids = np.asarray(patient_ids).ravel()[finite]
+            if len(X) == 0:
+                return
+
+        self._merge(self._stream(GLOBAL_KEY), len(X), X.mean(axis=0), X.var(axis=0))
+
+        if patient_ids is None:
+            return
+
+        if len(X) == 1:
+            self._merge(self._stream(np.asarray(patient_ids).ravel().tolist()[0]), 1, X[0], np.zeros(X.shape[1]))
+            return
+
+        keys, inverse = np.unique(np.asarray(patient_ids), return_inverse=True)
+        counts = np.bincount(inverse, minlength=len(keys))
+        sums = np.zeros((len(keys), X.shape[1]))
+        squares = np.zeros((len(keys), X.shape[1]))
+        np.add.at(sums, inverse, X)
+        np.add.at(squares, inverse, X * X)
+
+        means = sums / counts[:, None]
+        variances = np.maximum(squares / counts[:, None] - means * means, 0)
+        for i, key in enumerate(keys.tolist()):
+            self._merge(self._stream(key), int(counts[i]), means[i], variances[i])
+
+    def drift_scores(self, key=GLOBAL_KEY):
+        stats = self.streams.get(key)
+        if stats is None or stats.count == 0:
+            return None
+
+        n = min(stats.count, self.window)
+        effect = (stats.mean - self.train_mean) / self.train_std
+        log_var_ratio = np.log(np.maximum(stats.var, 1e-12) / self.train_std ** 2)
+
+        # Mean shift as a z-test; variance ratio via its large-sample normal approximation
+        z_mean = np.abs(effect * np.sqrt(n))
+        shifted = np.abs(effect) > self.effect_threshold
+        if key == GLOBAL_KEY:
+            z_var = np.abs((np.exp(log_var_ratio) - 1) * np.sqrt(n / 2))
+            score = np.maximum(z_mean, z_var)
+            shifted |= np.abs(log_var_ratio) > self.log_var_threshold
+        else:
+            score = z_mean
+
+        alarm = (n >= self.min_samples) & (score > self.z_threshold) & shifted
+
+        return {
+            'count': stats.count,
+            'features': {
+                name: {
+                    'score': float(score[i]),
+                    'mean_shift': float(effect[i]),
+                    'variance_ratio': float(np.exp(log_var_ratio[i])),
+                    'alarm': bool(alarm[i])
+                }
+                for i, name in enumerate(self.feature_names)
+            },
+            'max_score': float(score.max()),
+            'alarm': bool(alarm.any())
+        }
+
+    def get_report(self):
+        report = {'global': self.drift_scores(GLOBAL_KEY), 'patients': {}}
+        for key in self.streams:
+            if key != GLOBAL_KEY:
+                report['patients'][key] = self.drift_scores(key)
+        return report
+
+    def alarms(self):
+        return [
+            key for key in self.streams
+            if self.drift_scores(key)['alarm']
+        ]
+
+    def reset(self, key=None):
+        if key is None:
+            self.streams.clear()
+        else:
+            self.streams.pop(key, None)
@@ -0,0 +1,120 @@
+import numpy as np
+
+
+def average_path_length(n):
+    # c(n) from Liu et al.: expected path length of an unsuccessful BST search
+    n = np.asarray(n, dtype=float)
+    result = np.zeros_like(n)
+    result[n == 2] = 1.0
+    large = n > 2
+    result[large] = 2.0 * (np.log(n[large] - 1.0) + np.euler_gamma) - 2.0 * (n[large] - 1.0) / n[large]
+    return result
+
+
+class ForestExplainer:
+    """Per-feature contributions to IsolationForest scores from the paths taken.
+
+    The baseline is the path length h* at the model's decision threshold
+    (offset_). For each tree, the deficit h* - h(x) is shared across the
+    features split on along the path, weighted by how much each split shrinks
+    the node (log n_parent / n_child). Averaged over trees the contributions
+    sum to h* - E[h(x)], which is positive exactly for flagged readings, so
+    positive values push a reading towards anomalous and negative towards normal.
+    """
+
+    def __init__(self, model, feature_names, batch_size=4096):
+        self.feature_names = list(feature_names)
+        self.batch_size = batch_size
+        self.n_estimators = len(model.estimators_)
+        self.expected_path_length = float(average_path_length([model.max_samples_])[0])
+        # score_samples = -2 ** (-E[h] / c(max_samples)), inverted at the decision offset
+        self.threshold_path_length = -self.expected_path_length * np.log2(-model.offset_)
+
+        left, right, feature, threshold, n_samples, roots = [], [], [], [], [], []
+        offset = 0
+        for tree, tree_features in zip(model.estimators_, model.estimators_features_):
+            t = tree.tree_
+            is_leaf = t.children_left == -1
+            roots.append(offset)
+            # Leaves point at themselves so every path can advance in lockstep
+            own = np.arange(t.node_count) + offset
+            left.append(np.where(is_leaf, own, t.children_left + offset))
+            right.append(np.where(is_leaf, own, t.children_right + offset))
+            feature.append(np.where(is_leaf, -1, np.asarray(tree_features)[np.maximum(t.feature, 0)]))
+            threshold.append(t.threshold)
+            n_samples.append(t.n_node_samples)
+            offset += t.node_count
+
+        self.left = np.concatenate(left)
+        self.right = np.concatenate(right)
+        self.feature = np.concatenate(feature)
+        self.threshold = np.concatenate(threshold)
+        self.log_samples = np.log(np.concatenate(n_samples).astype(float))
+        self.leaf_correction = average_path_length(np.concatenate(n_samples))
+        self.roots = np.array(roots)
+        self.max_depth = max(tree.tree_.max_depth for tree in model.estimators_)
+
+    @classmethod
+    def from_detector(cls, detector, **kwargs):
+        return cls(detector.model, detector.feature_names(), **kwargs)
+
+    def _walk(self, X):
+        # Advance every (row, tree) path one level per iteration
+        rows = np.arange(len(X))[:, None]
+        nodes = np.broadcast_to(self.roots, (len(X), self.n_estimators)).copy()
+        depth = np.zeros(nodes.shape)
+        steps = []
+        for _ in range(self.max_depth):
+            features = self.feature[nodes]
+            internal = features >= 0
+            if not internal.any():
+                break
+            values = X[rows, np.maximum(features, 0)]
+            children = np.where(values <= self.threshold[nodes], self.left[nodes], self.right[nodes])
+            steps.append((features, self.log_samples[nodes] - self.log_samples[children]))
+            depth += internal
+            nodes = children
+        return nodes, depth, steps
+
+    def _explain_batch(self, X):
+        leaves, depth, steps = self._walk(X)
+        path_length = depth + self.leaf_correction[leaves]
+        deficit = self.threshold_path_length - path_length
+
+        total_weight = self.log_samples[self.roots] - self.log_samples[leaves]
+        scale = np.divide(deficit, total_weight, out=np.zeros_like(deficit), where=total_weight > 0)
+
+        n_features = len(self.feature_names)
+        row_offsets = np.arange(len(X))[:, None] * n_features
+        contributions = np.zeros(len(X) * n_features)
+        for features, weights in steps:
+            internal = features >= 0
+            index = (row_offsets + features)[internal]
+            contributions += np.bincount(index, weights=(weights * scale)[internal],
+                                         minlength=len(contributions))
+
+        contributions = contributions.reshape(len(X), n_features) / self.n_estimators
+        return contributions, path_length.mean(axis=1)
+
+    def explain(self, X_scaled):
+        """Contributions for scaled features; returns (n_rows, n_features) and mean path lengths."""
+        X = np.asarray(X_scaled, dtype=np.float32)
+        contributions, path_lengths = [], []
+        for start in range(0, len(X), self.batch_size):
+            batch_contributions, batch_paths = self._explain_batch(X[start:start + self.batch_size])
+            contributions.append(batch_contributions)
+            path_lengths.append(batch_paths)
+
+        if not contributions:
+            return np.zeros((0, len(self.feature_names))), np.zeros(0)
+        return np.vstack(contributions), np.concatenate(path_lengths)
+
+    def top_features(self, contributions, top_k=3):
+        order = np.argsort(-contributions, axis=1)[:, :top_k]
+        return [
+            [
+                {'feature': self.feature_names[i], 'contribution': float(row[i])}
+                for i in indices if row[i] > 0
+            ]
+            for row, indices in zip(contributions, order)
+        ]
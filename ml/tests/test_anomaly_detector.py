@@ -0,0 +1,64 @@
+import io
+import os
+import sys
+import contextlib
+import numpy as np
+import pandas as pd
+import pytest
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from models.anomaly_detector import HealthAnomalyDetector
+from models.ecg_features import ECG_FEATURE_COLUMNS
+from sklearn.preprocessing import StandardScaler
+
+DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'synthetic_health_data.csv')
+
+
+@pytest.mark.parametrize('use_ecg_features', [False, True])
+def test_feature_names_match_prepared_columns(use_ecg_features):
+    detector = HealthAnomalyDetector(use_ecg_features=use_ecg_features)
+    columns = detector.feature_columns + (ECG_FEATURE_COLUMNS if use_ecg_features else [])
+    reading = pd.DataFrame([dict.fromkeys(columns, 1.0)])
+
+    assert list(detector.prepare_features(reading).columns) == detector.feature_names()
+
+
+def holdout_mask(detector, chunksize):
+    return np.concatenate([
+        is_test for _, _, is_test in detector._iter_feature_chunks(DATA_PATH, chunksize, 0.2, 42)
+    ])
+
+
+@pytest.mark.parametrize('reservoir_size', [None, 500])
+def test_streaming_training_matches_in_memory_statistics(reservoir_size):
+    detector = HealthAnomalyDetector()
+    chunksize = 3000
+    is_test = holdout_mask(detector, chunksize)
+    X_train = detector.prepare_features(pd.read_csv(DATA_PATH)).values[~is_test]
+
+    if reservoir_size is None:
+        reservoir_size = detector.model.n_estimators * 256
+    reservoir, seen = detector._sample_training_rows(DATA_PATH, chunksize, 0.2, reservoir_size, 42)
+
+    assert seen == len(X_train)
+    assert len(reservoir) == min(len(X_train), reservoir_size)
+    # Chunked rolling windows differ from the in-memory ones only by float rounding
+    if len(reservoir) == len(X_train):
+        np.testing.assert_allclose(reservoir, X_train, atol=1e-9)
+    else:
+        distance = np.abs(reservoir[:, None, :] - X_train[None, :, :]).max(axis=2).min(axis=1)
+        assert distance.max() < 1e-9
+
+    full = StandardScaler().fit(X_train)
+    np.testing.assert_allclose(detector.scaler.mean_, full.mean_)
+    np.testing.assert_allclose(detector.scaler.var_, full.var_)
+
+    # The scoring pass must see the same holdout as the fitting pass
+    np.testing.assert_array_equal(holdout_mask(detector, chunksize), is_test)
+
+
+def test_streaming_training_scores_the_holdout():
+    detector = HealthAnomalyDetector()
+    with contextlib.redirect_stdout(io.StringIO()):
+        metrics = detector.train_streaming(DATA_PATH, chunksize=3000)
+
+    assert metrics['accuracy'] > 0.8
@@ -0,0 +1,58 @@
+import io
+import os
+import sys
+import contextlib
+import numpy as np
+import pandas as pd
+import pytest
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from models.anomaly_detector import HealthAnomalyDetector
+from models.drift_monitor import DriftMonitor, GLOBAL_KEY
+
+DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'synthetic_health_data.csv')
+
+
+@pytest.fixture(scope='module')
+def detector():
+    detector = HealthAnomalyDetector()
+    with contextlib.redirect_stdout(io.StringIO()):
+        detector.train(pd.read_csv(DATA_PATH))
+    return detector
+
+
+def replay(detector, rows, shift=None):
+    monitor = DriftMonitor.from_detector(detector)
+    detector.attach_drift_monitor(monitor)
+    for _, row in rows.iterrows():
+        reading = row.to_dict()
+        if shift:
+            reading[shift[0]] += shift[1]
+        detector.predict(reading)
+    detector.attach_drift_monitor(None)
+    return monitor
+
+
+def test_training_data_scored_one_at_a_time_does_not_alarm(detector):
+    monitor = replay(detector, pd.read_csv(DATA_PATH).iloc[:300])
+
+    assert 'hr_variance' not in monitor.feature_names
+    assert monitor.alarms() == []
+
+
+def test_shifted_temperature_alarms(detector):
+    monitor = replay(detector, pd.read_csv(DATA_PATH).iloc[:300], shift=('temperature', 2.0))
+    report = monitor.drift_scores(GLOBAL_KEY)
+
+    assert report['alarm']
+    assert report['features']['temperature']['alarm']
+
+
+def test_readings_with_missing_vitals_are_skipped(detector):
+    monitor = DriftMonitor.from_detector(detector)
+    rows = pd.read_csv(DATA_PATH).iloc[:5].copy()
+    rows.loc[rows.index[0], ['bp_systolic', 'bp_diastolic']] = 0
+    monitor.update(detector.prepare_features(rows).values, ['a', 'a', 'b', 'b', 'b'])
+
+    assert monitor.streams[GLOBAL_KEY].count == 4
+    assert monitor.streams['a'].count == 1
+    assert np.isfinite(monitor.drift_scores()['max_score'])
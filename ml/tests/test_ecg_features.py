@@ -0,0 +1,61 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from models.ecg_features import ECGFeatureExtractor, ECGSynthesizer, synthesize_ecg
+from models.anomaly_detector import HealthAnomalyDetector
+
+
+def stream(signal, sampling_rate, chunk_size):
+    extractor = ECGFeatureExtractor(sampling_rate=sampling_rate)
+    peaks = []
+    for start in range(0, len(signal), chunk_size):
+        peaks.extend(extractor.process_chunk('band', signal[start:start + chunk_size]).tolist())
+    return peaks, extractor.get_features('band')
+
+
+@pytest.mark.parametrize('sampling_rate', [250, 500])
+def test_peaks_and_features_do_not_depend_on_chunk_size(sampling_rate):
+    np.random.seed(7)
+    signal = synthesize_ecg(60, duration=60, sampling_rate=sampling_rate)
+
+    reference_peaks, reference_features = stream(signal, sampling_rate, len(signal))
+    assert 57 <= len(reference_peaks) <= 60
+
+    for chunk_size in [sampling_rate, 125, 25, 10]:
+        peaks, features = stream(signal, sampling_rate, chunk_size)
+        assert peaks == reference_peaks
+        assert features == pytest.approx(reference_features)
+
+
+def test_irregular_rhythm_scores_higher_than_regular():
+    np.random.seed(3)
+    _, regular = stream(synthesize_ecg(75, duration=60), 250, 50)
+    _, irregular = stream(synthesize_ecg(75, duration=60, irregular=True), 250, 50)
+
+    assert regular['ecg_hr'] == pytest.approx(75, rel=0.05)
+    assert irregular['ecg_irregularity'] > 2 * regular['ecg_irregularity']
+
+
+def test_consecutive_strips_keep_the_rhythm():
+    np.random.seed(5)
+    synthesizer = ECGSynthesizer()
+    signal = np.concatenate([synthesizer.next_strip(75, 2) for _ in range(30)])
+    _, stitched = stream(signal, 250, 250)
+    _, continuous = stream(synthesize_ecg(75, duration=60), 250, 250)
+
+    assert stitched['ecg_hr'] == pytest.approx(75, rel=0.05)
+    assert stitched['ecg_irregularity'] < 1.5 * continuous['ecg_irregularity']
+
+
+def test_missing_ecg_columns_are_rejected():
+    detector = HealthAnomalyDetector(use_ecg_features=True)
+    reading = pd.DataFrame([{
+        'heart_rate': 75, 'spo2': 98, 'temperature': 98.6,
+        'bp_systolic': 120, 'bp_diastolic': 80, 'ecg': 0
+    }])
+
+    with pytest.raises(ValueError, match='ecg_hr'):
+        detector.prepare_features(reading)
@@ -0,0 +1,46 @@
+import io
+import os
+import sys
+import contextlib
+import numpy as np
+import pandas as pd
+import pytest
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from models.anomaly_detector import HealthAnomalyDetector
+from models.forest_explainer import ForestExplainer, average_path_length
+
+DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'synthetic_health_data.csv')
+
+
+@pytest.fixture(scope='module')
+def explained():
+    df = pd.read_csv(DATA_PATH)
+    detector = HealthAnomalyDetector()
+    with contextlib.redirect_stdout(io.StringIO()):
+        detector.train(df)
+
+    X_scaled = detector.scaler.transform(detector.prepare_features(df))
+    explainer = ForestExplainer.from_detector(detector)
+    contributions, path_lengths = explainer.explain(X_scaled)
+    return detector.model, X_scaled, explainer, contributions, path_lengths
+
+
+def test_path_lengths_match_forest_scores(explained):
+    model, X_scaled, _, _, path_lengths = explained
+    expected = -average_path_length([model.max_samples_])[0] * np.log2(-model.score_samples(X_scaled))
+
+    np.testing.assert_allclose(path_lengths, expected, rtol=0, atol=1e-12)
+
+
+def test_contributions_sum_to_margin_past_threshold(explained):
+    _, _, explainer, contributions, path_lengths = explained
+    margin = explainer.threshold_path_length - path_lengths
+
+    np.testing.assert_allclose(contributions.sum(axis=1), margin, rtol=0, atol=1e-12)
+
+
+def test_positive_margin_marks_exactly_the_flagged_rows(explained):
+    model, X_scaled, _, contributions, _ = explained
+    flagged = model.predict(X_scaled) == -1
+
+    np.testing.assert_array_equal(contributions.sum(axis=1) > 0, flagged)